@@ -4,7 +4,7 @@ Classes for generating lists of detected events
 import numpy as np
 from yt.funcs import issue_deprecation_warning
 from pyxsim.utils import mylog
-from yt.units.yt_array import YTQuantity, YTArray, uconcatenate
+from yt.units.yt_array import YTQuantity, YTArray
 import astropy.io.fits as pyfits
 import astropy.wcs as pywcs
 import h5py
@@ -32,39 +32,113 @@ comm = communication_system.communicators[-1]
 def communicate_events(my_events, root=0):
     if parallel_capable:
         new_events = {}
-        mpi_int = get_mpi_type("int32")
-        mpi_double = get_mpi_type("float64")
         local_num_events = my_events["xsky"].size
         sizes = comm.comm.gather(local_num_events, root=root)
         if comm.rank == 0:
-            num_events = sum(sizes)
-            disps = [sum(sizes[:i]) for i in range(len(sizes))]
-            for key in my_events:
-                if key in ["pi", "pha"]:
-                    dtype = "int32"
-                else:
-                    dtype = "float64"
-                new_events[key] = np.zeros(num_events, dtype=dtype)
-        else:
-            sizes = []
-            disps = []
-            for key in my_events:
-                new_events[key] = np.empty([])
-        for key in my_events:
-            if key in ["pi", "pha"]:
-                mpi_type = mpi_int
+            sizes = np.array(sizes)
+            num_events = sizes.sum()
+            disps = np.cumsum(sizes)-sizes
+        # Keys with the same type are packed together into one buffer so
+        # that we only need one Gatherv per type instead of one per key
+        int_keys = [key for key in my_events if key in ["pi", "pha"]]
+        float_keys = [key for key in my_events if key not in int_keys]
+        for dtype, keys in [("float64", float_keys), ("int32", int_keys)]:
+            if len(keys) == 0:
+                continue
+            nkeys = len(keys)
+            mpi_type = get_mpi_type(dtype)
+            send_buf = np.empty((local_num_events, nkeys), dtype=dtype)
+            for i, key in enumerate(keys):
+                send_buf[:,i] = my_events[key]
+            if comm.rank == 0:
+                recv_buf = np.zeros((num_events, nkeys), dtype=dtype)
+                counts = sizes*nkeys
+                displs = disps*nkeys
             else:
-                mpi_type = mpi_double
-            comm.comm.Gatherv([my_events[key], local_num_events, mpi_type],
-                              [new_events[key], (sizes, disps), mpi_type], root=root)
-            if key == "eobs":
-                new_events[key] = YTArray(new_events[key], "keV")
-            if key.endswith("sky"):
-                new_events[key] = YTArray(new_events[key], "deg")
+                recv_buf = np.empty([])
+                counts = []
+                displs = []
+            comm.comm.Gatherv([send_buf, send_buf.size, mpi_type],
+                              [recv_buf, (counts, displs), mpi_type], root=root)
+            for i, key in enumerate(keys):
+                if comm.rank == 0:
+                    new_events[key] = recv_buf[:,i]
+                else:
+                    new_events[key] = np.empty([])
+                if key == "eobs":
+                    new_events[key] = YTArray(new_events[key], "keV")
+                if key.endswith("sky"):
+                    new_events[key] = YTArray(new_events[key], "deg")
         return new_events
     else:
         return my_events
 
+def _reduce_array(arr, root=0):
+    # Sum an array onto the root using the buffer interface, which
+    # is much faster than pickling it with comm.reduce
+    from mpi4py import MPI
+    mpi_type = get_mpi_type(arr.dtype.name)
+    if comm.rank == root:
+        out = np.empty_like(arr)
+        recv_buf = [out, mpi_type]
+    else:
+        out = None
+        recv_buf = None
+    comm.comm.Reduce([arr, mpi_type], recv_buf, op=MPI.SUM, root=root)
+    return out
+
+_wcs_cache = {}
+
+def _get_image_wcs(sky_center, dtheta, nx):
+    # Image WCSes only depend on a few numbers, so we reuse them
+    # instead of setting up wcslib again every time. The WCSes are
+    # shared between callers, so they must never be modified.
+    key = (tuple(float(x) for x in sky_center), float(dtheta), nx)
+    if key not in _wcs_cache:
+        if len(_wcs_cache) >= 4:
+            _wcs_cache.clear()
+        wcs = pywcs.WCS(naxis=2)
+        wcs.wcs.crpix = [0.5*(nx+1)]*2
+        wcs.wcs.crval = list(key[0])
+        wcs.wcs.cdelt = [-dtheta, dtheta]
+        wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+        wcs.wcs.cunit = ["deg"]*2
+        _wcs_cache[key] = wcs
+    return _wcs_cache[key]
+
+def _in_fov(xx, yy, nx):
+    # Both the event file and the image keep events inside the closed
+    # interval [0.5, nx+0.5] in pixel coordinates. Events which wcslib
+    # couldn't project come back as NaN and fail these comparisons.
+    return (xx >= 0.5) & (xx <= float(nx)+0.5) & \
+           (yy >= 0.5) & (yy <= float(nx)+0.5)
+
+def _world_to_pixel(wcs, xsky, ysky):
+    # Call wcslib directly instead of going through WCS.wcs_world2pix,
+    # which adds a lot of Python overhead. wcslib rejects empty inputs,
+    # which we can get on a process with no events.
+    if xsky.size == 0:
+        return np.zeros(0), np.zeros(0)
+    pix = wcs.wcs.s2p(np.column_stack([xsky, ysky]), 1)["pixcrd"]
+    return pix[:,0], pix[:,1]
+
+def _pixel_to_world(wcs, pixcrd):
+    # pixcrd is an (N, 2) array of pixel coordinates
+    if pixcrd.shape[0] == 0:
+        return np.zeros(0), np.zeros(0)
+    world = wcs.wcs.p2s(pixcrd, 1)["world"]
+    return world[:,0], world[:,1]
+
+def _use_mpio():
+    # Each process can only do its own I/O on a shared HDF5 file if
+    # h5py has been built against a parallel HDF5.
+    return parallel_capable and h5py.get_config().mpi
+
+def _read_h5_slab(dset, start, end):
+    arr = np.empty(end-start, dtype=dset.dtype)
+    dset.read_direct(arr, source_sel=np.s_[start:end])
+    return arr
+
 class EventList(object):
 
     def __init__(self, events, parameters):
@@ -94,13 +168,39 @@ class EventList(object):
         return key in self.events
 
     def __add__(self, other):
-        validate_parameters(self.parameters, other.parameters, skip=["sky_center"])
+        return self.concat([self, other])
+
+    @classmethod
+    def concat(cls, event_lists):
+        """
+        Combine a sequence of :class:`~pyxsim.event_list.EventList`
+        objects with the same parameters into a single one. This gives
+        the same result as adding them together, but the combined arrays
+        are only allocated once. The result is an instance of the class
+        this method is called on.
+        """
+        first = event_lists[0]
+        for other in event_lists[1:]:
+            validate_parameters(first.parameters, other.parameters, skip=["sky_center"])
+        num_events = sum(e["xsky"].size for e in event_lists)
         events = {}
-        for item1, item2 in zip(self.items(), other.items()):
-            k1, v1 = item1
-            k2, v2 = item2
-            events[k1] = uconcatenate([v1,v2])
-        return type(self)(events, dict(self.parameters))
+        for key, value in first.items():
+            units = getattr(value, "units", None)
+            arr = np.empty(num_events, dtype=value.dtype)
+            start = 0
+            for e in event_lists:
+                v = e[key]
+                if units is not None:
+                    # Only convert (and so copy) if the units differ
+                    if v.units != units:
+                        v = v.in_units(units)
+                    v = v.d
+                arr[start:start+v.size] = v
+                start += v.size
+            if units is not None:
+                arr = YTArray(arr, units)
+            events[key] = arr
+        return cls(events, dict(first.parameters))
 
     def __iter__(self):
         return iter(self.events)
@@ -113,11 +213,14 @@ class EventList(object):
         events = {}
         parameters = {}
 
-        f = h5py.File(h5file, "r")
+        if _use_mpio():
+            f = h5py.File(h5file, "r", driver="mpio", comm=comm.comm)
+        else:
+            f = h5py.File(h5file, "r")
 
         p = f["/parameters"]
-        parameters["exp_time"] = YTQuantity(p["exp_time"].value, "s")
-        parameters["area"] = YTQuantity(p["area"].value, "cm**2")
+        parameters["exp_time"] = YTQuantity(p["exp_time"][()], "s")
+        parameters["area"] = YTQuantity(p["area"][()], "cm**2")
         parameters["sky_center"] = YTArray(p["sky_center"][:], "deg")
 
         d = f["/data"]
@@ -126,18 +229,18 @@ class EventList(object):
         start_e = comm.rank*num_events//comm.size
         end_e = (comm.rank+1)*num_events//comm.size
 
-        events["xsky"] = YTArray(d["xsky"][start_e:end_e], "deg")
-        events["ysky"] = YTArray(d["ysky"][start_e:end_e], "deg")
-        events["eobs"] = YTArray(d["eobs"][start_e:end_e], "keV")
+        events["xsky"] = YTArray(_read_h5_slab(d["xsky"], start_e, end_e), "deg")
+        events["ysky"] = YTArray(_read_h5_slab(d["ysky"], start_e, end_e), "deg")
+        events["eobs"] = YTArray(_read_h5_slab(d["eobs"], start_e, end_e), "keV")
         if "rmf" in p:
-            parameters["rmf"] = force_unicode(p["rmf"].value)
-            parameters["arf"] = force_unicode(p["arf"].value)
-            parameters["channel_type"] = force_unicode(p["channel_type"].value)
-            parameters["mission"] = force_unicode(p["mission"].value)
-            parameters["telescope"] = force_unicode(p["telescope"].value)
-            parameters["instrument"] = force_unicode(p["instrument"].value)
+            parameters["rmf"] = force_unicode(p["rmf"][()])
+            parameters["arf"] = force_unicode(p["arf"][()])
+            parameters["channel_type"] = force_unicode(p["channel_type"][()])
+            parameters["mission"] = force_unicode(p["mission"][()])
+            parameters["telescope"] = force_unicode(p["telescope"][()])
+            parameters["instrument"] = force_unicode(p["instrument"][()])
             chantype = parameters["channel_type"]
-            events[chantype] = d[chantype][start_e:end_e]
+            events[chantype] = _read_h5_slab(d[chantype], start_e, end_e)
 
         f.close()
 
@@ -175,9 +278,12 @@ class EventList(object):
         wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
         wcs.wcs.cunit = ["deg"]*2
 
-        xx = tblhdu.data["X"][start_e:end_e]
-        yy = tblhdu.data["Y"][start_e:end_e]
-        xx, yy = wcs.wcs_pix2world(xx, yy, 1)
+        # Read the pixel coordinates straight into the array that wcslib
+        # takes, rather than slicing them out and stacking them after
+        pixcrd = np.empty((end_e-start_e, 2))
+        pixcrd[:,0] = tblhdu.data["X"][start_e:end_e]
+        pixcrd[:,1] = tblhdu.data["Y"][start_e:end_e]
+        xx, yy = _pixel_to_world(wcs, pixcrd)
 
         events["xsky"] = YTArray(xx, "degree")
         events["ysky"] = YTArray(yy, "degree")
@@ -233,93 +339,96 @@ class EventList(object):
 
             dtheta = fov.to("deg").v / nx
 
-            wcs = pywcs.WCS(naxis=2)
-            wcs.wcs.crpix = [0.5*(nx+1)]*2
-            wcs.wcs.crval = self.parameters["sky_center"].d
-            wcs.wcs.cdelt = [-dtheta, dtheta]
-            wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
-            wcs.wcs.cunit = ["deg"] * 2
+            wcs = _get_image_wcs(self.parameters["sky_center"].d, dtheta, nx)
 
-            xx, yy = wcs.wcs_world2pix(self["xsky"].d, self["ysky"].d, 1)
+            xx, yy = _world_to_pixel(wcs, events["xsky"].d, events["ysky"].d)
 
-            keepx = np.logical_and(xx >= 0.5, xx <= float(nx)+0.5)
-            keepy = np.logical_and(yy >= 0.5, yy <= float(nx)+0.5)
-            keep = np.logical_and(keepx, keepy)
+            keep = _in_fov(xx, yy, nx)
 
-            n_events = keep.sum()
+            n_events = int(keep.sum())
 
             mylog.info("Threw out %d events because " % (xx.size-n_events) +
                        "they fell outside the field of view.")
 
-            col_e = pyfits.Column(name='ENERGY', format='E', unit='eV',
-                                  array=events["eobs"].in_units("eV").d[keep])
-            col_x = pyfits.Column(name='X', format='D', unit='pixel',
-                                  array=xx[keep])
-            col_y = pyfits.Column(name='Y', format='D', unit='pixel',
-                                  array=yy[keep])
-
-            cols = [col_e, col_x, col_y]
-
+            # Fill a single record array of the final size and hand it
+            # to the table directly, rather than making a masked copy of
+            # each column which pyfits then copies again
+            dtype = [("ENERGY", "f4"), ("X", "f8"), ("Y", "f8")]
+            units = ["eV", "pixel", "pixel"]
             if "channel_type" in self.parameters:
                 chantype = self.parameters["channel_type"]
                 if chantype == "pha":
                     cunit = "adu"
                 elif chantype == "pi":
                     cunit = "Chan"
-                col_ch = pyfits.Column(name=chantype.upper(), format='1J',
-                                       unit=cunit, array=events[chantype][keep])
-                cols.append(col_ch)
+                dtype += [(chantype.upper(), "i4"), ("TIME", "f8")]
+                units += [cunit, "s"]
+
+            data = np.empty(n_events, dtype=dtype)
+            # Convert keV to eV after masking, on the kept events only. The
+            # multiply is done in double precision and only rounded to
+            # single precision once, when it is written into the table.
+            np.multiply(np.compress(keep, events["eobs"].d), 1000.0,
+                        out=data["ENERGY"])
+            np.compress(keep, xx, out=data["X"])
+            np.compress(keep, yy, out=data["Y"])
 
-                time = np.random.uniform(size=n_events, low=0.0,
-                                         high=float(self.parameters["exp_time"]))
-                col_t = pyfits.Column(name="TIME", format='1D', unit='s',
-                                      array=time)
-                cols.append(col_t)
+            if "channel_type" in self.parameters:
+                np.compress(keep, events[chantype], out=data[chantype.upper()])
+                data["TIME"] = np.random.uniform(size=n_events, low=0.0,
+                                                 high=float(self.parameters["exp_time"]))
 
-            coldefs = pyfits.ColDefs(cols)
-            tbhdu = pyfits.BinTableHDU.from_columns(coldefs)
+            tbhdu = pyfits.BinTableHDU(data=data)
+            for col, unit in zip(tbhdu.columns, units):
+                col.unit = unit
             tbhdu.name = "EVENTS"
 
-            tbhdu.header["MTYPE1"] = "sky"
-            tbhdu.header["MFORM1"] = "x,y"
-            tbhdu.header["MTYPE2"] = "EQPOS"
-            tbhdu.header["MFORM2"] = "RA,DEC"
-            tbhdu.header["TCTYP2"] = "RA---TAN"
-            tbhdu.header["TCTYP3"] = "DEC--TAN"
-            tbhdu.header["TCRVL2"] = float(self.parameters["sky_center"][0])
-            tbhdu.header["TCRVL3"] = float(self.parameters["sky_center"][1])
-            tbhdu.header["TCDLT2"] = -dtheta
-            tbhdu.header["TCDLT3"] = dtheta
-            tbhdu.header["TCRPX2"] = 0.5*(nx+1)
-            tbhdu.header["TCRPX3"] = 0.5*(nx+1)
-            tbhdu.header["TLMIN2"] = 0.5
-            tbhdu.header["TLMIN3"] = 0.5
-            tbhdu.header["TLMAX2"] = float(nx)+0.5
-            tbhdu.header["TLMAX3"] = float(nx)+0.5
+            tbhdu.header.update([
+                ("MTYPE1", "sky"),
+                ("MFORM1", "x,y"),
+                ("MTYPE2", "EQPOS"),
+                ("MFORM2", "RA,DEC"),
+                ("TCTYP2", "RA---TAN"),
+                ("TCTYP3", "DEC--TAN"),
+                ("TCRVL2", float(self.parameters["sky_center"][0])),
+                ("TCRVL3", float(self.parameters["sky_center"][1])),
+                ("TCDLT2", -dtheta),
+                ("TCDLT3", dtheta),
+                ("TCRPX2", 0.5*(nx+1)),
+                ("TCRPX3", 0.5*(nx+1)),
+                ("TLMIN2", 0.5),
+                ("TLMIN3", 0.5),
+                ("TLMAX2", float(nx)+0.5),
+                ("TLMAX3", float(nx)+0.5),
+            ])
             if "channel_type" in self.parameters:
                 rmf = RedistributionMatrixFile(self.parameters["rmf"])
-                tbhdu.header["TLMIN4"] = rmf.cmin
-                tbhdu.header["TLMAX4"] = rmf.cmax
-                tbhdu.header["RESPFILE"] = os.path.split(self.parameters["rmf"])[-1]
-                tbhdu.header["PHA_BINS"] = rmf.n_ch
-                tbhdu.header["ANCRFILE"] = os.path.split(self.parameters["arf"])[-1]
-                tbhdu.header["CHANTYPE"] = self.parameters["channel_type"]
-                tbhdu.header["MISSION"] = self.parameters["mission"]
-                tbhdu.header["TELESCOP"] = self.parameters["telescope"]
-                tbhdu.header["INSTRUME"] = self.parameters["instrument"]
-            tbhdu.header["EXPOSURE"] = exp_time
-            tbhdu.header["TSTART"] = 0.0
-            tbhdu.header["TSTOP"] = exp_time
-            tbhdu.header["AREA"] = float(self.parameters["area"])
-            tbhdu.header["HDUVERS"] = "1.1.0"
-            tbhdu.header["RADECSYS"] = "FK5"
-            tbhdu.header["EQUINOX"] = 2000.0
-            tbhdu.header["HDUCLASS"] = "OGIP"
-            tbhdu.header["HDUCLAS1"] = "EVENTS"
-            tbhdu.header["HDUCLAS2"] = "ACCEPTED"
-            tbhdu.header["DATE"] = t_begin.tt.isot
-            tbhdu.header["DATE-OBS"] = t_begin.tt.isot
-            tbhdu.header["DATE-END"] = t_end.tt.isot
+                tbhdu.header.update([
+                    ("TLMIN4", rmf.cmin),
+                    ("TLMAX4", rmf.cmax),
+                    ("RESPFILE", os.path.split(self.parameters["rmf"])[-1]),
+                    ("PHA_BINS", rmf.n_ch),
+                    ("ANCRFILE", os.path.split(self.parameters["arf"])[-1]),
+                    ("CHANTYPE", self.parameters["channel_type"]),
+                    ("MISSION", self.parameters["mission"]),
+                    ("TELESCOP", self.parameters["telescope"]),
+                    ("INSTRUME", self.parameters["instrument"]),
+                ])
+            tbhdu.header.update([
+                ("EXPOSURE", exp_time),
+                ("TSTART", 0.0),
+                ("TSTOP", exp_time),
+                ("AREA", float(self.parameters["area"])),
+                ("HDUVERS", "1.1.0"),
+                ("RADECSYS", "FK5"),
+                ("EQUINOX", 2000.0),
+                ("HDUCLASS", "OGIP"),
+                ("HDUCLAS1", "EVENTS"),
+                ("HDUCLAS2", "ACCEPTED"),
+                ("DATE", t_begin.tt.isot),
+                ("DATE-OBS", t_begin.tt.isot),
+                ("DATE-END", t_end.tt.isot),
+            ])
 
             hdulist = [pyfits.PrimaryHDU(), tbhdu]
 
@@ -331,16 +440,18 @@ class EventList(object):
 
                 tbhdu_gti = pyfits.BinTableHDU.from_columns([start,stop])
                 tbhdu_gti.name = "STDGTI"
-                tbhdu_gti.header["TSTART"] = 0.0
-                tbhdu_gti.header["TSTOP"] = exp_time
-                tbhdu_gti.header["HDUCLASS"] = "OGIP"
-                tbhdu_gti.header["HDUCLAS1"] = "GTI"
-                tbhdu_gti.header["HDUCLAS2"] = "STANDARD"
-                tbhdu_gti.header["RADECSYS"] = "FK5"
-                tbhdu_gti.header["EQUINOX"] = 2000.0
-                tbhdu_gti.header["DATE"] = t_begin.tt.isot
-                tbhdu_gti.header["DATE-OBS"] = t_begin.tt.isot
-                tbhdu_gti.header["DATE-END"] = t_end.tt.isot
+                tbhdu_gti.header.update([
+                    ("TSTART", 0.0),
+                    ("TSTOP", exp_time),
+                    ("HDUCLASS", "OGIP"),
+                    ("HDUCLAS1", "GTI"),
+                    ("HDUCLAS2", "STANDARD"),
+                    ("RADECSYS", "FK5"),
+                    ("EQUINOX", 2000.0),
+                    ("DATE", t_begin.tt.isot),
+                    ("DATE-OBS", t_begin.tt.isot),
+                    ("DATE-END", t_end.tt.isot),
+                ])
 
                 hdulist.append(tbhdu_gti)
 
@@ -375,20 +486,23 @@ class EventList(object):
             mylog.info("Writing SIMPUT catalog file %s_simput.fits " % prefix +
                        "and SIMPUT photon list file %s_phlist.fits." % prefix)
 
-            if emin is None and emax is None:
-                idxs = slice(None, None, None)
-            else:
+            eobs = events["eobs"].d
+            xsky = events["xsky"].d
+            ysky = events["ysky"].d
+            if emin is not None or emax is not None:
                 if emin is None:
-                    emin = events["eobs"].min().value
+                    emin = eobs.min()
                 if emax is None:
-                    emax = events["eobs"].max().value
-                idxs = np.logical_and(events["eobs"].d >= emin, events["eobs"].d <= emax)
+                    emax = eobs.max()
+                idxs = (eobs >= emin) & (eobs <= emax)
+                eobs = np.compress(idxs, eobs)
+                xsky = np.compress(idxs, xsky)
+                ysky = np.compress(idxs, ysky)
 
-            flux = np.sum(events["eobs"][idxs]).to("erg") / \
+            flux = YTQuantity(eobs.sum(), "keV").to("erg") / \
                    self.parameters["exp_time"]/self.parameters["area"]
 
-            write_photon_list(prefix, prefix, flux.v, events["xsky"][idxs].d,
-                              events["ysky"][idxs].d, events["eobs"][idxs].d,
+            write_photon_list(prefix, prefix, flux.v, xsky, ysky, eobs,
                               overwrite=overwrite)
 
         comm.barrier()
@@ -397,21 +511,50 @@ class EventList(object):
         """
         Write an :class:`~pyxsim.event_list.EventList` to the HDF5 file given by *h5file*.
         """
-        events = communicate_events(self.events)
+        use_mpio = _use_mpio()
 
-        if comm.rank == 0:
+        if use_mpio:
+            # Every process writes its own slab of the datasets, so
+            # the events don't have to be gathered onto the root
+            events = self.events
+            sizes = comm.comm.allgather(events["xsky"].size)
+            num_events = sum(sizes)
+            start_e = sum(sizes[:comm.rank])
+            f = h5py.File(h5file, "w", driver="mpio", comm=comm.comm)
+        else:
+            events = communicate_events(self.events)
+            if comm.rank == 0:
+                num_events = events["xsky"].size
+                start_e = 0
+                f = h5py.File(h5file, "w")
 
-            f = h5py.File(h5file, "w")
+        if use_mpio or comm.rank == 0:
+
+            end_e = start_e+events["xsky"].size
 
             p = f.create_group("parameters")
             p.create_dataset("exp_time", data=float(self.parameters["exp_time"]))
             p.create_dataset("area", data=float(self.parameters["area"]))
             p.create_dataset("sky_center", data=self.parameters["sky_center"].d)
 
+            # Chunk the event datasets so that they can be compressed and
+            # slabs of them read back cheaply. gzip is built into every
+            # HDF5 library, so the files stay readable by any HDF5 tool.
+            # Writing filtered datasets with parallel HDF5 needs collective
+            # I/O, so those files are only chunked.
+            dset_kwargs = {}
+            if num_events > 0:
+                dset_kwargs["chunks"] = (min(1 << 16, num_events),)
+                if not use_mpio:
+                    dset_kwargs["compression"] = "gzip"
+                    dset_kwargs["compression_opts"] = 4
+                    dset_kwargs["shuffle"] = True
+
             d = f.create_group("data")
-            d.create_dataset("xsky", data=events["xsky"].d)
-            d.create_dataset("ysky", data=events["ysky"].d)
-            d.create_dataset("eobs", data=events["eobs"].d)
+            for key in ["xsky", "ysky", "eobs"]:
+                dset = d.create_dataset(key, (num_events,), dtype="float64",
+                                        **dset_kwargs)
+                dset[start_e:end_e] = events[key].d
             if "rmf" in self.parameters:
                 p.create_dataset("arf", data=self.parameters["arf"])
                 p.create_dataset("rmf", data=self.parameters["rmf"])
@@ -420,7 +563,9 @@ class EventList(object):
                 p.create_dataset("telescope", data=self.parameters["telescope"])
                 p.create_dataset("instrument", data=self.parameters["instrument"])
                 chantype = self.parameters["channel_type"]
-                d.create_dataset(chantype, data=events[chantype])
+                dset = d.create_dataset(chantype, (num_events,), dtype="int32",
+                                        **dset_kwargs)
+                dset[start_e:end_e] = events[chantype]
 
             f.close()
 
@@ -449,54 +594,57 @@ class EventList(object):
         """
         fov = parse_value(fov, "arcmin")
 
-        if emin is None:
-            mask_emin = np.ones(self.num_events, dtype='bool')
-        else:
-            mask_emin = self["eobs"].d > emin
-        if emax is None:
-            mask_emax = np.ones(self.num_events, dtype='bool')
-        else:
-            mask_emax = self["eobs"].d < emax
+        eobs = self["eobs"].d
+        xsky = self["xsky"].d
+        ysky = self["ysky"].d
 
-        mask = np.logical_and(mask_emin, mask_emax)
+        mask = np.ones(eobs.size, dtype='bool')
+        if emin is not None:
+            mask &= eobs > emin
+        if emax is not None:
+            mask &= eobs < emax
 
         dtheta = fov.to("deg").v/nx
 
-        xbins = np.linspace(0.5, float(nx)+0.5, nx+1, endpoint=True)
-        ybins = np.linspace(0.5, float(nx)+0.5, nx+1, endpoint=True)
+        wcs = _get_image_wcs(self.parameters["sky_center"].d, dtheta, nx)
 
-        wcs = pywcs.WCS(naxis=2)
-        wcs.wcs.crpix = [0.5*(nx+1)]*2
-        wcs.wcs.crval = self.parameters["sky_center"].d
-        wcs.wcs.cdelt = [-dtheta, dtheta]
-        wcs.wcs.ctype = ["RA---TAN","DEC--TAN"]
-        wcs.wcs.cunit = ["deg"]*2
+        xx, yy = _world_to_pixel(wcs, xsky, ysky)
 
-        xx, yy = wcs.wcs_world2pix(self["xsky"].d, self["ysky"].d, 1)
+        mask &= _in_fov(xx, yy, nx)
 
-        H, xedges, yedges = np.histogram2d(xx[mask], yy[mask],
-                                           bins=[xbins, ybins])
+        # The pixels are unit-width, so the bin indices can be computed
+        # directly instead of searching through bin edges. Only events in
+        # the field of view are binned, so the indices are finite and
+        # non-negative, and events on the outer edge go in the last pixel.
+        ix = np.minimum(np.compress(mask, xx)-0.5, nx-1).astype(np.intp)
+        iy = np.minimum(np.compress(mask, yy)-0.5, nx-1).astype(np.intp)
+        ix *= nx
+        ix += iy
+        H = np.bincount(ix, minlength=nx*nx).reshape(nx, nx)
+        H = H.astype("float64")
 
         if parallel_capable:
-            H = comm.comm.reduce(H, root=0)
+            H = _reduce_array(H)
 
         if comm.rank == 0:
 
             hdu = pyfits.PrimaryHDU(H.T)
 
-            hdu.header["MTYPE1"] = "EQPOS"
-            hdu.header["MFORM1"] = "RA,DEC"
-            hdu.header["CTYPE1"] = "RA---TAN"
-            hdu.header["CTYPE2"] = "DEC--TAN"
-            hdu.header["CRPIX1"] = 0.5*(nx+1)
-            hdu.header["CRPIX2"] = 0.5*(nx+1)
-            hdu.header["CRVAL1"] = float(self.parameters["sky_center"][0])
-            hdu.header["CRVAL2"] = float(self.parameters["sky_center"][1])
-            hdu.header["CUNIT1"] = "deg"
-            hdu.header["CUNIT2"] = "deg"
-            hdu.header["CDELT1"] = -dtheta
-            hdu.header["CDELT2"] = dtheta
-            hdu.header["EXPOSURE"] = float(self.parameters["exp_time"])
+            hdu.header.update([
+                ("MTYPE1", "EQPOS"),
+                ("MFORM1", "RA,DEC"),
+                ("CTYPE1", "RA---TAN"),
+                ("CTYPE2", "DEC--TAN"),
+                ("CRPIX1", 0.5*(nx+1)),
+                ("CRPIX2", 0.5*(nx+1)),
+                ("CRVAL1", float(self.parameters["sky_center"][0])),
+                ("CRVAL2", float(self.parameters["sky_center"][1])),
+                ("CUNIT1", "deg"),
+                ("CUNIT2", "deg"),
+                ("CDELT1", -dtheta),
+                ("CDELT2", dtheta),
+                ("EXPOSURE", float(self.parameters["exp_time"])),
+            ])
 
             hdu.writeto(imagefile, overwrite=overwrite)
 
@@ -525,7 +673,7 @@ class EventList(object):
         bins = 0.5*(ee[1:]+ee[:-1])
 
         if parallel_capable:
-            spec = comm.comm.reduce(spec, root=0)
+            spec = _reduce_array(spec)
 
         if comm.rank == 0:
 
@@ -539,30 +687,32 @@ class EventList(object):
             tbhdu = pyfits.BinTableHDU.from_columns(coldefs)
             tbhdu.name = "SPECTRUM"
 
-            tbhdu.header["DETCHANS"] = spec.shape[0]
-            tbhdu.header["TOTCTS"] = spec.sum()
-            tbhdu.header["EXPOSURE"] = float(self.parameters["exp_time"])
-            tbhdu.header["LIVETIME"] = float(self.parameters["exp_time"])
-            tbhdu.header["CONTENT"] = "pi"
-            tbhdu.header["HDUCLASS"] = "OGIP"
-            tbhdu.header["HDUCLAS1"] = "SPECTRUM"
-            tbhdu.header["HDUCLAS2"] = "TOTAL"
-            tbhdu.header["HDUCLAS3"] = "TYPE:I"
-            tbhdu.header["HDUCLAS4"] = "COUNT"
-            tbhdu.header["HDUVERS"] = "1.1.0"
-            tbhdu.header["HDUVERS1"] = "1.1.0"
-            tbhdu.header["CHANTYPE"] = "pi"
-            tbhdu.header["BACKFILE"] = "none"
-            tbhdu.header["CORRFILE"] = "none"
-            tbhdu.header["POISSERR"] = True
-            tbhdu.header["RESPFILE"] = "none"
-            tbhdu.header["ANCRFILE"] = "none"
-            tbhdu.header["MISSION"] = "none"
-            tbhdu.header["TELESCOP"] = "none"
-            tbhdu.header["INSTRUME"] = "none"
-            tbhdu.header["AREASCAL"] = 1.0
-            tbhdu.header["CORRSCAL"] = 0.0
-            tbhdu.header["BACKSCAL"] = 1.0
+            tbhdu.header.update([
+                ("DETCHANS", spec.shape[0]),
+                ("TOTCTS", spec.sum()),
+                ("EXPOSURE", float(self.parameters["exp_time"])),
+                ("LIVETIME", float(self.parameters["exp_time"])),
+                ("CONTENT", "pi"),
+                ("HDUCLASS", "OGIP"),
+                ("HDUCLAS1", "SPECTRUM"),
+                ("HDUCLAS2", "TOTAL"),
+                ("HDUCLAS3", "TYPE:I"),
+                ("HDUCLAS4", "COUNT"),
+                ("HDUVERS", "1.1.0"),
+                ("HDUVERS1", "1.1.0"),
+                ("CHANTYPE", "pi"),
+                ("BACKFILE", "none"),
+                ("CORRFILE", "none"),
+                ("POISSERR", True),
+                ("RESPFILE", "none"),
+                ("ANCRFILE", "none"),
+                ("MISSION", "none"),
+                ("TELESCOP", "none"),
+                ("INSTRUME", "none"),
+                ("AREASCAL", 1.0),
+                ("CORRSCAL", 0.0),
+                ("BACKSCAL", 1.0),
+            ])
 
             hdulist = pyfits.HDUList([pyfits.PrimaryHDU(), tbhdu])
 
@@ -601,7 +751,7 @@ class ConvolvedEventList(EventList):
         bins = (np.arange(rmf.n_ch)+rmf.cmin).astype("int32")
 
         if parallel_capable:
-            spec = comm.comm.reduce(spec, root=0)
+            spec = _reduce_array(spec)
 
         if comm.rank == 0:
 
@@ -615,30 +765,32 @@ class ConvolvedEventList(EventList):
             tbhdu = pyfits.BinTableHDU.from_columns(coldefs)
             tbhdu.name = "SPECTRUM"
 
-            tbhdu.header["DETCHANS"] = spec.shape[0]
-            tbhdu.header["TOTCTS"] = spec.sum()
-            tbhdu.header["EXPOSURE"] = float(self.parameters["exp_time"])
-            tbhdu.header["LIVETIME"] = float(self.parameters["exp_time"])
-            tbhdu.header["CONTENT"] = spectype
-            tbhdu.header["HDUCLASS"] = "OGIP"
-            tbhdu.header["HDUCLAS1"] = "SPECTRUM"
-            tbhdu.header["HDUCLAS2"] = "TOTAL"
-            tbhdu.header["HDUCLAS3"] = "TYPE:I"
-            tbhdu.header["HDUCLAS4"] = "COUNT"
-            tbhdu.header["HDUVERS"] = "1.1.0"
-            tbhdu.header["HDUVERS1"] = "1.1.0"
-            tbhdu.header["CHANTYPE"] = spectype
-            tbhdu.header["BACKFILE"] = "none"
-            tbhdu.header["CORRFILE"] = "none"
-            tbhdu.header["POISSERR"] = True
-            tbhdu.header["RESPFILE"] = os.path.split(self.parameters["rmf"])[-1]
-            tbhdu.header["ANCRFILE"] = os.path.split(self.parameters["arf"])[-1]
-            tbhdu.header["MISSION"] = self.parameters["mission"]
-            tbhdu.header["TELESCOP"] = self.parameters["telescope"]
-            tbhdu.header["INSTRUME"] = self.parameters["instrument"]
-            tbhdu.header["AREASCAL"] = 1.0
-            tbhdu.header["CORRSCAL"] = 0.0
-            tbhdu.header["BACKSCAL"] = 1.0
+            tbhdu.header.update([
+                ("DETCHANS", spec.shape[0]),
+                ("TOTCTS", spec.sum()),
+                ("EXPOSURE", float(self.parameters["exp_time"])),
+                ("LIVETIME", float(self.parameters["exp_time"])),
+                ("CONTENT", spectype),
+                ("HDUCLASS", "OGIP"),
+                ("HDUCLAS1", "SPECTRUM"),
+                ("HDUCLAS2", "TOTAL"),
+                ("HDUCLAS3", "TYPE:I"),
+                ("HDUCLAS4", "COUNT"),
+                ("HDUVERS", "1.1.0"),
+                ("HDUVERS1", "1.1.0"),
+                ("CHANTYPE", spectype),
+                ("BACKFILE", "none"),
+                ("CORRFILE", "none"),
+                ("POISSERR", True),
+                ("RESPFILE", os.path.split(self.parameters["rmf"])[-1]),
+                ("ANCRFILE", os.path.split(self.parameters["arf"])[-1]),
+                ("MISSION", self.parameters["mission"]),
+                ("TELESCOP", self.parameters["telescope"]),
+                ("INSTRUME", self.parameters["instrument"]),
+                ("AREASCAL", 1.0),
+                ("CORRSCAL", 0.0),
+                ("BACKSCAL", 1.0),
+            ])
 
             hdulist = pyfits.HDUList([pyfits.PrimaryHDU(), tbhdu])
 
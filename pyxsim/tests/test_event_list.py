@@ -0,0 +1,116 @@
+import numpy as np
+import astropy.io.fits as pyfits
+import astropy.wcs as pywcs
+import tempfile
+import os
+import shutil
+from yt import YTQuantity, YTArray
+from numpy.random import RandomState
+from numpy.testing import assert_allclose, assert_array_equal
+from pyxsim.event_list import EventList
+
+
+def make_events(prng, n_evt):
+    events = {"xsky": YTArray(prng.uniform(29.0, 31.0, size=n_evt), "deg"),
+              "ysky": YTArray(prng.uniform(44.0, 46.0, size=n_evt), "deg"),
+              "eobs": YTArray(prng.uniform(0.1, 10.0, size=n_evt), "keV")}
+    parameters = {"exp_time": YTQuantity(100.0, "ks"),
+                  "area": YTQuantity(1000.0, "cm**2"),
+                  "sky_center": YTArray([30.0, 45.0], "deg")}
+    return EventList(events, parameters)
+
+
+def test_concat():
+
+    prng = RandomState(25)
+
+    event_lists = [make_events(prng, n_evt) for n_evt in [1000, 0, 2500, 300]]
+
+    events1 = EventList.concat(event_lists)
+    events2 = event_lists[0]
+    for events in event_lists[1:]:
+        events2 = events2 + events
+
+    assert events1.num_events == 3800
+    for key in ["xsky", "ysky", "eobs"]:
+        assert str(events1[key].units) == str(event_lists[0][key].units)
+        assert_allclose(events1[key].d, events2[key].d)
+        assert_allclose(events1[key].d,
+                        np.concatenate([e[key].d for e in event_lists]))
+
+
+def test_write_fits_image():
+
+    tmpdir = tempfile.mkdtemp()
+    curdir = os.getcwd()
+    os.chdir(tmpdir)
+
+    prng = RandomState(26)
+
+    events = make_events(prng, 20000)
+
+    # The field of view only covers part of the events
+    nx = 32
+    fov = 60.0
+    dtheta = fov/60.0/nx
+
+    wcs = pywcs.WCS(naxis=2)
+    wcs.wcs.crpix = [0.5*(nx+1)]*2
+    wcs.wcs.crval = [30.0, 45.0]
+    wcs.wcs.cdelt = [-dtheta, dtheta]
+    wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    wcs.wcs.cunit = ["deg"]*2
+
+    xx, yy = wcs.wcs_world2pix(events["xsky"].d, events["ysky"].d, 1)
+    bins = np.linspace(0.5, nx+0.5, nx+1)
+    eobs = events["eobs"].d
+
+    for emin, emax in [(None, None), (0.5, 2.0), (None, 7.0), (3.0, None)]:
+        mask = np.ones(eobs.size, dtype='bool')
+        if emin is not None:
+            mask &= eobs > emin
+        if emax is not None:
+            mask &= eobs < emax
+        H = np.histogram2d(xx[mask], yy[mask], bins=[bins, bins])[0]
+
+        events.write_fits_image("image.fits", fov, nx, emin=emin,
+                                emax=emax, overwrite=True)
+
+        with pyfits.open("image.fits") as f:
+            assert f[0].data.shape == (nx, nx)
+            assert f[0].data.sum() > 0
+            assert_array_equal(f[0].data, H.T)
+
+    os.chdir(curdir)
+    shutil.rmtree(tmpdir)
+
+
+def test_h5_file_roundtrip():
+
+    tmpdir = tempfile.mkdtemp()
+    curdir = os.getcwd()
+    os.chdir(tmpdir)
+
+    prng = RandomState(27)
+
+    # Check both an empty file and one with more than one chunk
+    for n_evt in [0, 100000]:
+        events1 = make_events(prng, n_evt)
+        events1.write_h5_file("events.h5")
+        events2 = EventList.from_h5_file("events.h5")
+
+        assert events2.num_events == n_evt
+        for key in ["xsky", "ysky", "eobs"]:
+            assert str(events2[key].units) == str(events1[key].units)
+            assert_array_equal(events2[key].d, events1[key].d)
+        for key in ["exp_time", "area", "sky_center"]:
+            assert_allclose(events2.parameters[key].d,
+                            events1.parameters[key].d)
+
+    os.chdir(curdir)
+    shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    test_concat()
+    test_write_fits_image()
+    test_h5_file_roundtrip()